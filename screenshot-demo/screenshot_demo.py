@@ -12,10 +12,14 @@ messages to their AI, where responses include tool calls, responses, and thinkin
 import os
 import sys
 import base64
+import functools
+import io
 import uuid
 import platform
 import subprocess
 import random
+import shutil
+from concurrent.futures import ThreadPoolExecutor
 from typing import Optional
 from dotenv import load_dotenv
 
@@ -24,24 +28,154 @@ os.environ["_INTERNAL_LLMA_MULTIMODAL"] = "true"
 
 from posthog import Posthog
 
-# Add parent directory to path for provider imports
-sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
-
 from posthog.ai.anthropic import Anthropic
 from posthog.ai.openai import OpenAI
 
 # Load environment variables from parent directory
 load_dotenv(os.path.join(os.path.dirname(__file__), '..', '.env'))
 
+_SCRIPT_DIR = os.path.dirname(os.path.abspath(__file__))
+_SAMPLES_DIR = os.path.join(_SCRIPT_DIR, "samples")
+
+# Base64 of each format's leading magic bytes, so the type can be read
+# straight off the encoded string without decoding it
+_BASE64_IMAGE_PREFIXES = (
+    ("iVBORw0KGgo", "image/png"),
+    ("/9j/", "image/jpeg"),
+    ("R0lGOD", "image/gif"),
+    ("UklGR", "image/webp"),
+)
+
+
+# Linux screenshot tools in order of preference, as (argv, writes PNG to
+# stdout); tools that can't write to stdout get the temp file path appended
+_LINUX_SCREENSHOT_TOOLS = (
+    (("gnome-screenshot", "-f"), False),
+    (("scrot",), False),
+    (("import", "-window", "root", "png:-"), True),
+)
+
+
+# Computer-use style tools, shared by every request that asks for them
+ANTHROPIC_TOOLS = [
+    {
+        "name": "click_element",
+        "description": "Click on a UI element at the specified coordinates",
+        "input_schema": {
+            "type": "object",
+            "properties": {
+                "x": {"type": "number", "description": "X coordinate"},
+                "y": {"type": "number", "description": "Y coordinate"},
+                "element_description": {"type": "string", "description": "Description of the element to click"}
+            },
+            "required": ["x", "y"]
+        }
+    },
+    {
+        "name": "type_text",
+        "description": "Type text at the current cursor position",
+        "input_schema": {
+            "type": "object",
+            "properties": {
+                "text": {"type": "string", "description": "Text to type"}
+            },
+            "required": ["text"]
+        }
+    },
+    {
+        "name": "scroll",
+        "description": "Scroll the current view",
+        "input_schema": {
+            "type": "object",
+            "properties": {
+                "direction": {"type": "string", "enum": ["up", "down", "left", "right"]},
+                "amount": {"type": "number", "description": "Amount to scroll in pixels"}
+            },
+            "required": ["direction"]
+        }
+    }
+]
+
+OPENAI_TOOLS = [
+    {
+        "type": "function",
+        "function": {
+            "name": "click_element",
+            "description": "Click on a UI element at the specified coordinates",
+            "parameters": {
+                "type": "object",
+                "properties": {
+                    "x": {"type": "number", "description": "X coordinate"},
+                    "y": {"type": "number", "description": "Y coordinate"},
+                    "element_description": {"type": "string", "description": "Description of the element"}
+                },
+                "required": ["x", "y"]
+            }
+        }
+    },
+    {
+        "type": "function",
+        "function": {
+            "name": "type_text",
+            "description": "Type text at the current cursor position",
+            "parameters": {
+                "type": "object",
+                "properties": {
+                    "text": {"type": "string", "description": "Text to type"}
+                },
+                "required": ["text"]
+            }
+        }
+    },
+    {
+        "type": "function",
+        "function": {
+            "name": "scroll",
+            "description": "Scroll the current view",
+            "parameters": {
+                "type": "object",
+                "properties": {
+                    "direction": {"type": "string", "enum": ["up", "down", "left", "right"]},
+                    "amount": {"type": "number", "description": "Amount to scroll"}
+                },
+                "required": ["direction"]
+            }
+        }
+    }
+]
+
+
+@functools.lru_cache(maxsize=32)
+def _encode_image_file(path: str, mtime_ns: int) -> str:
+    """Base64 of an image file; the mtime in the key retires entries for edited files"""
+    with open(path, "rb") as f:
+        return base64.b64encode(f.read()).decode("utf-8")
+
+
+def _detect_media_type(base64_image: str) -> str:
+    """Return the image MIME type of base64 data, defaulting to PNG"""
+    for prefix, media_type in _BASE64_IMAGE_PREFIXES:
+        if base64_image.startswith(prefix):
+            return media_type
+    return "image/png"
+
 
 class ScreenshotDemo:
     """Demo tool for sending screenshots with LLM requests to PostHog"""
 
     def __init__(self):
         self.debug_mode = os.getenv('DEBUG') == '1'
+        self._system = platform.system()
+        # Optional cap (px) on captured screenshot size; 0 sends full resolution
+        self.max_dimension = int(os.getenv("SCREENSHOT_MAX_DIMENSION", "0"))
+
+        # Read credentials once; everything below uses these
+        posthog_api_key = os.getenv("POSTHOG_API_KEY")
+        anthropic_api_key = os.getenv("ANTHROPIC_API_KEY")
+        openai_api_key = os.getenv("OPENAI_API_KEY")
 
         # Validate environment
-        if not self._validate_environment():
+        if not self._validate_environment(posthog_api_key, anthropic_api_key, openai_api_key):
             print("Environment validation failed. Please check your .env file.")
             sys.exit(1)
 
@@ -50,41 +184,57 @@ class ScreenshotDemo:
 
         # Initialize PostHog client
         self.posthog = Posthog(
-            os.getenv("POSTHOG_API_KEY"),
+            posthog_api_key,
             host=os.getenv("POSTHOG_HOST", "https://app.posthog.com"),
             super_properties={"$ai_session_id": self.ai_session_id}
         )
 
         self.distinct_id = os.getenv("POSTHOG_DISTINCT_ID", "screenshot-demo-user")
 
+        # (samples dir mtime, PNG names) so menu loops don't relist the folder
+        self._sample_listing = None
+
+        # Only installed tools are tried, so a capture never spawns a missing binary
+        self._linux_screenshot_tools = []
+        if self._system == "Linux":
+            self._linux_screenshot_tools = [
+                (list(argv), to_stdout)
+                for argv, to_stdout in _LINUX_SCREENSHOT_TOOLS
+                if shutil.which(argv[0])
+            ]
+
         # Initialize AI clients with PostHog integration
         self.anthropic_client = None
         self.openai_client = None
 
-        if os.getenv("ANTHROPIC_API_KEY"):
+        if anthropic_api_key:
             self.anthropic_client = Anthropic(
-                api_key=os.getenv("ANTHROPIC_API_KEY"),
+                api_key=anthropic_api_key,
                 posthog_client=self.posthog
             )
 
-        if os.getenv("OPENAI_API_KEY"):
+        if openai_api_key:
             self.openai_client = OpenAI(
-                api_key=os.getenv("OPENAI_API_KEY"),
+                api_key=openai_api_key,
                 posthog_client=self.posthog
             )
 
         print("PostHog client initialized successfully")
         print(f"AI Session ID: {self.ai_session_id}")
 
-    def _validate_environment(self) -> bool:
+    def _validate_environment(
+        self,
+        posthog_api_key: Optional[str],
+        anthropic_api_key: Optional[str],
+        openai_api_key: Optional[str],
+    ) -> bool:
         """Validate required environment variables"""
-        api_key = os.getenv("POSTHOG_API_KEY")
-        if not api_key or len(api_key) < 10:
+        if not posthog_api_key or len(posthog_api_key) < 10:
             print("POSTHOG_API_KEY is missing or invalid")
             return False
 
         # Need at least one AI provider
-        if not os.getenv("ANTHROPIC_API_KEY") and not os.getenv("OPENAI_API_KEY"):
+        if not anthropic_api_key and not openai_api_key:
             print("At least one of ANTHROPIC_API_KEY or OPENAI_API_KEY is required")
             return False
 
@@ -93,35 +243,50 @@ class ScreenshotDemo:
     def clear_screen(self):
         """Clear the terminal screen"""
         if not self.debug_mode:
-            os.system('cls' if platform.system() == 'Windows' else 'clear')
+            if self._system == 'Windows':
+                os.system('cls')
+            else:
+                # ANSI clear + cursor home; no shell spawned per redraw
+                sys.stdout.write("\x1b[2J\x1b[H")
+                sys.stdout.flush()
 
     def capture_screenshot(self) -> Optional[str]:
         """Capture a screenshot and return as base64 string"""
         temp_path = "/tmp/screenshot_demo.png"
 
         try:
-            system = platform.system()
+            system = self._system
+            image_data = None
 
             if system == "Darwin":  # macOS
                 subprocess.run(
                     ["screencapture", "-x", temp_path],
                     check=True,
-                    capture_output=True
+                    stdout=subprocess.DEVNULL,
+                    stderr=subprocess.DEVNULL
                 )
             elif system == "Linux":
-                # Try various screenshot tools
-                tools = [
-                    ["gnome-screenshot", "-f", temp_path],
-                    ["scrot", temp_path],
-                    ["import", "-window", "root", temp_path]
-                ]
+                # Try each installed screenshot tool until one succeeds
                 captured = False
-                for tool in tools:
+                for argv, to_stdout in self._linux_screenshot_tools:
                     try:
-                        subprocess.run(tool, check=True, capture_output=True)
+                        if to_stdout:
+                            image_data = subprocess.run(
+                                argv,
+                                check=True,
+                                stdout=subprocess.PIPE,
+                                stderr=subprocess.DEVNULL
+                            ).stdout
+                        else:
+                            subprocess.run(
+                                argv + [temp_path],
+                                check=True,
+                                stdout=subprocess.DEVNULL,
+                                stderr=subprocess.DEVNULL
+                            )
                         captured = True
                         break
-                    except (subprocess.CalledProcessError, FileNotFoundError):
+                    except subprocess.CalledProcessError:
                         continue
 
                 if not captured:
@@ -135,13 +300,15 @@ class ScreenshotDemo:
                 print(f"Unsupported platform: {system}")
                 return None
 
-            # Read and encode the screenshot
-            with open(temp_path, "rb") as f:
-                image_data = f.read()
+            # Read the screenshot back unless the tool piped it to us
+            if image_data is None:
+                with open(temp_path, "rb") as f:
+                    image_data = f.read()
 
-            # Clean up temp file
-            os.remove(temp_path)
+                # Clean up temp file
+                os.remove(temp_path)
 
+            image_data = self._downscale(image_data)
             return base64.b64encode(image_data).decode("utf-8")
 
         except subprocess.CalledProcessError as e:
@@ -151,12 +318,32 @@ class ScreenshotDemo:
             print(f"Error capturing screenshot: {e}")
             return None
 
+    def _downscale(self, image_data: bytes) -> bytes:
+        """Shrink a PNG capture to fit within max_dimension, if one is set"""
+        if not self.max_dimension:
+            return image_data
+        try:
+            from PIL import Image
+        except ImportError:
+            print("SCREENSHOT_MAX_DIMENSION needs Pillow (uv pip install pillow); sending full size")
+            return image_data
+
+        try:
+            with Image.open(io.BytesIO(image_data)) as image:
+                if max(image.size) <= self.max_dimension:
+                    return image_data
+                image.thumbnail((self.max_dimension, self.max_dimension))
+                output = io.BytesIO()
+                image.save(output, format="PNG", optimize=True)
+        except (OSError, ValueError, Image.DecompressionBombError) as e:
+            print(f"Couldn't downscale screenshot ({e}); sending full size")
+            return image_data
+        return output.getvalue()
+
     def load_image_file(self, file_path: str) -> Optional[str]:
         """Load an image file and return as base64 string"""
         try:
-            with open(file_path, "rb") as f:
-                image_data = f.read()
-            return base64.b64encode(image_data).decode("utf-8")
+            return _encode_image_file(file_path, os.stat(file_path).st_mtime_ns)
         except FileNotFoundError:
             print(f"File not found: {file_path}")
             return None
@@ -164,34 +351,42 @@ class ScreenshotDemo:
             print(f"Error loading image: {e}")
             return None
 
+    def _list_sample_files(self) -> list[str]:
+        """PNG names in the samples folder, relisted only when the folder changes"""
+        try:
+            mtime_ns = os.stat(_SAMPLES_DIR).st_mtime_ns
+        except FileNotFoundError:
+            return []
+        if self._sample_listing is None or self._sample_listing[0] != mtime_ns:
+            with os.scandir(_SAMPLES_DIR) as entries:
+                sample_files = [e.name for e in entries if e.name.endswith('.png') and e.is_file()]
+            self._sample_listing = (mtime_ns, sample_files)
+        return self._sample_listing[1]
+
     def get_sample_screenshot(self) -> tuple[str, str]:
         """Load a random sample screenshot from the samples folder.
 
         Returns:
             Tuple of (base64_image, image_name) or (None, None) if no images found.
         """
-        script_dir = os.path.dirname(os.path.abspath(__file__))
-        samples_dir = os.path.join(script_dir, "samples")
-
         # Get list of PNG files in samples directory
-        if os.path.exists(samples_dir):
-            sample_files = [f for f in os.listdir(samples_dir) if f.endswith('.png')]
-            if sample_files:
-                selected = random.choice(sample_files)
-                sample_path = os.path.join(samples_dir, selected)
-                image_data = self.load_image_file(sample_path)
-                if image_data:
-                    return image_data, selected
+        sample_files = self._list_sample_files()
+        if sample_files:
+            selected = random.choice(sample_files)
+            sample_path = os.path.join(_SAMPLES_DIR, selected)
+            image_data = self.load_image_file(sample_path)
+            if image_data:
+                return image_data, selected
 
         # Fallback to single sample-screenshot.png
-        sample_path = os.path.join(script_dir, "sample-screenshot.png")
+        sample_path = os.path.join(_SCRIPT_DIR, "sample-screenshot.png")
         if os.path.exists(sample_path):
             image_data = self.load_image_file(sample_path)
             if image_data:
                 return image_data, "sample-screenshot.png"
 
         print("No sample images found.")
-        print(f"Please add PNG files to: {samples_dir}")
+        print(f"Please add PNG files to: {_SAMPLES_DIR}")
         return None, None
 
     def send_with_anthropic(self, query: str, base64_image: str, with_tools: bool = False) -> str:
@@ -209,7 +404,7 @@ class ScreenshotDemo:
                         "type": "image",
                         "source": {
                             "type": "base64",
-                            "media_type": "image/png",
+                            "media_type": _detect_media_type(base64_image),
                             "data": base64_image
                         }
                     }
@@ -217,47 +412,8 @@ class ScreenshotDemo:
             }
         ]
 
-        # Define tools if requested (simulating computer-use style tool calls)
-        tools = None
-        if with_tools:
-            tools = [
-                {
-                    "name": "click_element",
-                    "description": "Click on a UI element at the specified coordinates",
-                    "input_schema": {
-                        "type": "object",
-                        "properties": {
-                            "x": {"type": "number", "description": "X coordinate"},
-                            "y": {"type": "number", "description": "Y coordinate"},
-                            "element_description": {"type": "string", "description": "Description of the element to click"}
-                        },
-                        "required": ["x", "y"]
-                    }
-                },
-                {
-                    "name": "type_text",
-                    "description": "Type text at the current cursor position",
-                    "input_schema": {
-                        "type": "object",
-                        "properties": {
-                            "text": {"type": "string", "description": "Text to type"}
-                        },
-                        "required": ["text"]
-                    }
-                },
-                {
-                    "name": "scroll",
-                    "description": "Scroll the current view",
-                    "input_schema": {
-                        "type": "object",
-                        "properties": {
-                            "direction": {"type": "string", "enum": ["up", "down", "left", "right"]},
-                            "amount": {"type": "number", "description": "Amount to scroll in pixels"}
-                        },
-                        "required": ["direction"]
-                    }
-                }
-            ]
+        # Simulate computer-use style tool calls if requested
+        tools = ANTHROPIC_TOOLS if with_tools else None
 
         request_params = {
             "model": "claude-sonnet-4-20250514",
@@ -275,9 +431,10 @@ class ScreenshotDemo:
             # Extract response text
             result_parts = []
             for block in response.content:
-                if hasattr(block, 'text'):
+                # Every content block carries a type discriminator
+                if block.type == 'text':
                     result_parts.append(block.text)
-                elif hasattr(block, 'type') and block.type == 'tool_use':
+                elif block.type == 'tool_use':
                     result_parts.append(f"[Tool Call: {block.name}({block.input})]")
 
             return "\n".join(result_parts) if result_parts else "No response"
@@ -299,63 +456,14 @@ class ScreenshotDemo:
                     {
                         "type": "image_url",
                         "image_url": {
-                            "url": f"data:image/png;base64,{base64_image}"
+                            "url": f"data:{_detect_media_type(base64_image)};base64,{base64_image}"
                         }
                     }
                 ]
             }
         ]
 
-        # Define tools if requested
-        tools = None
-        if with_tools:
-            tools = [
-                {
-                    "type": "function",
-                    "function": {
-                        "name": "click_element",
-                        "description": "Click on a UI element at the specified coordinates",
-                        "parameters": {
-                            "type": "object",
-                            "properties": {
-                                "x": {"type": "number", "description": "X coordinate"},
-                                "y": {"type": "number", "description": "Y coordinate"},
-                                "element_description": {"type": "string", "description": "Description of the element"}
-                            },
-                            "required": ["x", "y"]
-                        }
-                    }
-                },
-                {
-                    "type": "function",
-                    "function": {
-                        "name": "type_text",
-                        "description": "Type text at the current cursor position",
-                        "parameters": {
-                            "type": "object",
-                            "properties": {
-                                "text": {"type": "string", "description": "Text to type"}
-                            },
-                            "required": ["text"]
-                        }
-                    }
-                },
-                {
-                    "type": "function",
-                    "function": {
-                        "name": "scroll",
-                        "description": "Scroll the current view",
-                        "parameters": {
-                            "type": "object",
-                            "properties": {
-                                "direction": {"type": "string", "enum": ["up", "down", "left", "right"]},
-                                "amount": {"type": "number", "description": "Amount to scroll"}
-                            },
-                            "required": ["direction"]
-                        }
-                    }
-                }
-            ]
+        tools = OPENAI_TOOLS if with_tools else None
 
         request_params = {
             "model": "gpt-4o",
@@ -385,6 +493,15 @@ class ScreenshotDemo:
         except Exception as e:
             return f"Error: {str(e)}"
 
+    def _send_to_providers(self, executor: ThreadPoolExecutor, query: str, base64_image: str, with_tools: bool) -> dict:
+        """Start a request to each available provider; returns futures keyed by provider"""
+        futures = {}
+        if self.anthropic_client:
+            futures["anthropic"] = executor.submit(self.send_with_anthropic, query, base64_image, with_tools)
+        if self.openai_client:
+            futures["openai"] = executor.submit(self.send_with_openai, query, base64_image, with_tools)
+        return futures
+
     def run_demo(self, image_source: str = "sample", with_tools: bool = True):
         """Run the screenshot demo"""
         print("\n" + "=" * 60)
@@ -432,24 +549,25 @@ class ScreenshotDemo:
         print(f"\nQuery: {query}")
         print(f"With tools: {with_tools}")
 
-        # Send to available providers
+        # Send to available providers in parallel, then print in a fixed order
         results = {}
 
-        if self.anthropic_client:
-            print("\n--- Sending to Anthropic Claude ---")
-            results["anthropic"] = self.send_with_anthropic(query, base64_image, with_tools)
-            print(f"Response: {results['anthropic'][:500]}..." if len(results.get('anthropic', '')) > 500 else f"Response: {results.get('anthropic', 'N/A')}")
+        with ThreadPoolExecutor(max_workers=2) as executor:
+            futures = self._send_to_providers(executor, query, base64_image, with_tools)
 
-        if self.openai_client:
-            print("\n--- Sending to OpenAI GPT-4o ---")
-            results["openai"] = self.send_with_openai(query, base64_image, with_tools)
-            print(f"Response: {results['openai'][:500]}..." if len(results.get('openai', '')) > 500 else f"Response: {results.get('openai', 'N/A')}")
+            if "anthropic" in futures:
+                print("\n--- Sending to Anthropic Claude ---")
+                results["anthropic"] = futures["anthropic"].result()
+                print(f"Response: {results['anthropic'][:500]}..." if len(results.get('anthropic', '')) > 500 else f"Response: {results.get('anthropic', 'N/A')}")
 
-        # Flush PostHog events
-        self.posthog.flush()
+            if "openai" in futures:
+                print("\n--- Sending to OpenAI GPT-4o ---")
+                results["openai"] = futures["openai"].result()
+                print(f"Response: {results['openai'][:500]}..." if len(results.get('openai', '')) > 500 else f"Response: {results.get('openai', 'N/A')}")
 
+        # The PostHog client uploads in the background; main() waits for it on exit
         print("\n" + "=" * 60)
-        print("Events sent to PostHog!")
+        print("Events queued for PostHog!")
         print(f"Session ID: {self.ai_session_id}")
         print("=" * 60)
         print("\nCheck PostHog LLM Analytics to see how the screenshot data appears:")
@@ -535,44 +653,49 @@ class ScreenshotDemo:
             return
         print(f"Using image: {image_name}")
 
-        if self.anthropic_client:
-            print("\n--- Anthropic Response ---")
-            response = self.send_with_anthropic(query, base64_image, with_tools)
-            print(response)
+        with ThreadPoolExecutor(max_workers=2) as executor:
+            futures = self._send_to_providers(executor, query, base64_image, with_tools)
 
-        if self.openai_client:
-            print("\n--- OpenAI Response ---")
-            response = self.send_with_openai(query, base64_image, with_tools)
-            print(response)
+            if "anthropic" in futures:
+                print("\n--- Anthropic Response ---")
+                print(futures["anthropic"].result())
+
+            if "openai" in futures:
+                print("\n--- OpenAI Response ---")
+                print(futures["openai"].result())
 
-        self.posthog.flush()
-        print(f"\nEvents sent! Session ID: {self.ai_session_id}")
+        print(f"\nEvents queued! Session ID: {self.ai_session_id}")
 
 
 def main():
     """Main entry point"""
     demo = ScreenshotDemo()
 
-    # Check for command line arguments
-    if len(sys.argv) > 1:
-        arg = sys.argv[1]
-        if arg == "--quick":
-            demo.run_demo("sample", with_tools=False)
-        elif arg == "--tools":
-            demo.run_demo("sample", with_tools=True)
-        elif arg == "--capture":
-            demo.run_demo("capture", with_tools=True)
-        elif os.path.isfile(arg):
-            demo.run_demo(arg, with_tools=True)
+    try:
+        # Check for command line arguments
+        if len(sys.argv) > 1:
+            arg = sys.argv[1]
+            if arg == "--quick":
+                demo.run_demo("sample", with_tools=False)
+            elif arg == "--tools":
+                demo.run_demo("sample", with_tools=True)
+            elif arg == "--capture":
+                demo.run_demo("capture", with_tools=True)
+            elif os.path.isfile(arg):
+                demo.run_demo(arg, with_tools=True)
+            else:
+                print(f"Usage: {sys.argv[0]} [--quick|--tools|--capture|<image_file>]")
+                print("  --quick   : Quick demo with sample image, no tools")
+                print("  --tools   : Demo with sample image and tool calls")
+                print("  --capture : Capture screenshot and send")
+                print("  <file>    : Load specific image file")
+                print("  (no args) : Interactive menu")
         else:
-            print(f"Usage: {sys.argv[0]} [--quick|--tools|--capture|<image_file>]")
-            print("  --quick   : Quick demo with sample image, no tools")
-            print("  --tools   : Demo with sample image and tool calls")
-            print("  --capture : Capture screenshot and send")
-            print("  <file>    : Load specific image file")
-            print("  (no args) : Interactive menu")
-    else:
-        demo.interactive_menu()
+            demo.interactive_menu()
+    finally:
+        # Image events are large and the SDK's own exit hook only makes a
+        # short best-effort attempt, so block once here until they're sent
+        demo.posthog.shutdown()
 
 
 if __name__ == "__main__":
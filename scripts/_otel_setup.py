@@ -0,0 +1,80 @@
+"""
+Shared OTel → PostHog setup for the OTel E2E test scripts.
+
+test_langchain_otel.py and test_pydantic_ai_otel.py both export spans to the
+same PostHog endpoint; this module owns the single TracerProvider they share
+so only one batch processor thread ever runs per process. Each script still
+installs its own framework instrumentation on top.
+"""
+
+import os
+import sys
+
+from opentelemetry import trace
+from opentelemetry.exporter.otlp.proto.http import Compression
+from opentelemetry.exporter.otlp.proto.http.trace_exporter import OTLPSpanExporter
+from opentelemetry.sdk.resources import Resource
+from opentelemetry.sdk.trace import TracerProvider
+from opentelemetry.sdk.trace.export import BatchSpanProcessor
+from opentelemetry.sdk.trace.sampling import ParentBased, TraceIdRatioBased
+
+tracer_provider: TracerProvider | None = None
+
+
+def configure_posthog_otel(service_name: str) -> TracerProvider:
+    global tracer_provider
+    # Installing a second provider would start another export thread and
+    # duplicate every span, so repeat calls reuse the first one.
+    if tracer_provider is not None:
+        return tracer_provider
+
+    posthog_api_key = os.getenv("POSTHOG_API_KEY")
+    posthog_host = os.getenv("POSTHOG_HOST", "http://localhost:8010")
+    debug = os.getenv("DEBUG", "0") == "1"
+
+    if not posthog_api_key:
+        print("ERROR: POSTHOG_API_KEY must be set in .env")
+        sys.exit(1)
+
+    resource_attrs: dict[str, str] = {
+        "service.name": service_name,
+        "user.id": os.getenv("POSTHOG_DISTINCT_ID", "otel-test-user"),
+    }
+    if debug:
+        resource_attrs["posthog.ai.debug"] = "true"
+
+    # Head-based sampling for load runs; debug runs always keep every trace
+    sample_rate = 1.0 if debug else float(os.getenv("OTEL_TRACES_SAMPLER_ARG", "1.0"))
+    provider = TracerProvider(
+        resource=Resource.create(resource_attrs),
+        sampler=ParentBased(root=TraceIdRatioBased(sample_rate)),
+    )
+    # Export sooner and in smaller batches than the SDK defaults (5s / 512)
+    # so bursts of tool spans aren't dropped; OTEL_BSP_* env vars still win.
+    processor = BatchSpanProcessor(
+        OTLPSpanExporter(
+            endpoint=f"{posthog_host}/i/v0/ai/otel",
+            headers={"Authorization": f"Bearer {posthog_api_key}"},
+            compression=Compression.Gzip,
+        ),
+        max_queue_size=int(os.getenv("OTEL_BSP_MAX_QUEUE_SIZE", "4096")),
+        schedule_delay_millis=int(os.getenv("OTEL_BSP_SCHEDULE_DELAY", "1000")),
+        max_export_batch_size=int(os.getenv("OTEL_BSP_MAX_EXPORT_BATCH_SIZE", "256")),
+        export_timeout_millis=int(os.getenv("OTEL_BSP_EXPORT_TIMEOUT", "10000")),
+    )
+    provider.add_span_processor(processor)
+    trace.set_tracer_provider(provider)
+    tracer_provider = provider
+    return provider
+
+
+def flush() -> None:
+    if tracer_provider:
+        tracer_provider.force_flush()
+
+
+DIVIDER = "=" * 60
+
+
+def header(num: int, title: str) -> None:
+    print(f"\n{DIVIDER}\n  Scenario {num}: {title}\n{DIVIDER}")
@@ -13,25 +13,25 @@ without depending on the providers/ directory.
 """
 
 import argparse
+import functools
 import json
-import logging
 import math
 import os
 import random
 import re
 import sys
+import threading
 import time
 import uuid
 from concurrent.futures import ThreadPoolExecutor, as_completed
 from datetime import datetime, timezone
 from typing import Generator, Optional
+from urllib.parse import urlencode
 from urllib.request import urlopen
 from zoneinfo import ZoneInfo
 
 from dotenv import load_dotenv
 
-from langchain_openai import ChatOpenAI
-from langchain_core.messages import HumanMessage, AIMessage, SystemMessage
 from posthog import Posthog
 
 
@@ -44,6 +44,9 @@ ANTHROPIC_MODEL = "claude-sonnet-4-5-20250929"
 GEMINI_MODEL = "gemini-2.5-flash"
 DEFAULT_MAX_TOKENS = 4000
 DEFAULT_POSTHOG_DISTINCT_ID = "user-hog"
+DIVIDER = "=" * 60
+# Only this many of the most recent user turns are resent to the model
+DEFAULT_MAX_HISTORY_TURNS = 20
 SYSTEM_PROMPT_FRIENDLY = (
     "You are a friendly AI that just makes conversation. "
     "You have access to a weather tool if the user asks about weather."
@@ -58,23 +61,43 @@ SYSTEM_PROMPT_ASSISTANT = (
 # Tool helpers
 # ---------------------------------------------------------------------------
 
+# WMO weather interpretation codes returned by Open-Meteo
+WEATHER_DESCRIPTIONS = {
+    0: "clear skies", 1: "mainly clear", 2: "partly cloudy", 3: "overcast",
+    45: "foggy", 48: "depositing rime fog",
+    51: "light drizzle", 53: "moderate drizzle", 55: "dense drizzle",
+    61: "slight rain", 63: "moderate rain", 65: "heavy rain",
+    71: "slight snow", 73: "moderate snow", 75: "heavy snow", 77: "snow grains",
+    80: "slight rain showers", 81: "moderate rain showers", 82: "violent rain showers",
+    85: "slight snow showers", 86: "heavy snow showers",
+    95: "thunderstorm", 96: "thunderstorm with slight hail",
+    99: "thunderstorm with heavy hail",
+}
+
+
+@functools.lru_cache(maxsize=256)
+def _fetch_current_weather(latitude: float, longitude: float) -> dict:
+    """Fetch current conditions from Open-Meteo; failed requests aren't cached."""
+    params = urlencode({
+        "latitude": latitude,
+        "longitude": longitude,
+        "current": "temperature_2m,relative_humidity_2m,apparent_temperature,precipitation,weather_code,wind_speed_10m",
+        "temperature_unit": "celsius",
+        "wind_speed_unit": "kmh",
+        "precipitation_unit": "mm",
+    })
+    url = f"https://api.open-meteo.com/v1/forecast?{params}"
+    with urlopen(url, timeout=10) as resp:
+        weather_data = json.loads(resp.read().decode())
+    return weather_data.get("current", {})
+
+
 def get_weather(latitude: float, longitude: float, location_name: str = None) -> str:
     """Get real weather data from Open-Meteo API using coordinates."""
     try:
-        from urllib.parse import urlencode
-        params = urlencode({
-            "latitude": latitude,
-            "longitude": longitude,
-            "current": "temperature_2m,relative_humidity_2m,apparent_temperature,precipitation,weather_code,wind_speed_10m",
-            "temperature_unit": "celsius",
-            "wind_speed_unit": "kmh",
-            "precipitation_unit": "mm",
-        })
-        url = f"https://api.open-meteo.com/v1/forecast?{params}"
-        with urlopen(url, timeout=10) as resp:
-            weather_data = json.loads(resp.read().decode())
-
-        current = weather_data.get("current", {})
+        # Models pick the same few cities over and over; ~1km is close enough
+        # to share one lookup for the length of a run.
+        current = _fetch_current_weather(round(float(latitude), 2), round(float(longitude), 2))
         temp_celsius = current.get("temperature_2m", 0)
         temp_fahrenheit = int(temp_celsius * 9 / 5 + 32)
         feels_like_celsius = current.get("apparent_temperature", temp_celsius)
@@ -82,18 +105,7 @@ def get_weather(latitude: float, longitude: float, location_name: str = None) ->
         wind_speed = current.get("wind_speed_10m", 0)
         precipitation = current.get("precipitation", 0)
 
-        weather_descriptions = {
-            0: "clear skies", 1: "mainly clear", 2: "partly cloudy", 3: "overcast",
-            45: "foggy", 48: "depositing rime fog",
-            51: "light drizzle", 53: "moderate drizzle", 55: "dense drizzle",
-            61: "slight rain", 63: "moderate rain", 65: "heavy rain",
-            71: "slight snow", 73: "moderate snow", 75: "heavy snow", 77: "snow grains",
-            80: "slight rain showers", 81: "moderate rain showers", 82: "violent rain showers",
-            85: "slight snow showers", 86: "heavy snow showers",
-            95: "thunderstorm", 96: "thunderstorm with slight hail",
-            99: "thunderstorm with heavy hail",
-        }
-        weather_desc = weather_descriptions.get(current.get("weather_code", 0), "unknown conditions")
+        weather_desc = WEATHER_DESCRIPTIONS.get(current.get("weather_code", 0), "unknown conditions")
         location_str = location_name if location_name else f"coordinates ({latitude}, {longitude})"
 
         result = (
@@ -199,6 +211,14 @@ def generate_inspirational_quote(topic: str = "general") -> str:
     return random.choice(topic_quotes)
 
 
+def _parse_tool_args(raw: Optional[str]) -> dict:
+    """Decode a tool call's JSON arguments; malformed or empty input means no args."""
+    try:
+        return json.loads(raw or "{}")
+    except json.JSONDecodeError:
+        return {}
+
+
 def execute_tool(tool_name: str, tool_input: dict) -> Optional[str]:
     """Execute a tool by name and return the result."""
     if tool_name in ("get_weather", "get_current_weather"):
@@ -369,10 +389,52 @@ GEMINI_TOOL_DECLARATIONS = [
 ]
 
 
+@functools.cache
+def _gemini_config():
+    """Built once per process; google-genai is only imported if Gemini is used."""
+    from google.genai import types
+
+    tools_obj = types.Tool(function_declarations=GEMINI_TOOL_DECLARATIONS)
+    return types.GenerateContentConfig(tools=[tools_obj])
+
+
+@functools.cache
+def _shared_chat_openai(model: str, temperature: float):
+    """One ChatOpenAI per settings, so every conversation reuses the same HTTP pool.
+
+    Callbacks are passed per invoke, never bound here, so sharing across
+    conversations doesn't mix their PostHog sessions.
+    """
+    from langchain_openai import ChatOpenAI
+
+    return ChatOpenAI(model=model, temperature=temperature, api_key=os.getenv("OPENAI_API_KEY"))
+
+
 # ---------------------------------------------------------------------------
 # Provider class
 # ---------------------------------------------------------------------------
 
+def _starts_user_turn(message) -> bool:
+    """Plain user text opens a turn; Anthropic tool results sent as user messages don't."""
+    return isinstance(message, dict) and message.get("role") == "user" and isinstance(message.get("content"), str)
+
+
+def _trim_turns(messages: list, max_turns: int, starts_turn, keep_first: bool) -> list:
+    """Return ``messages`` cut down to its last ``max_turns`` turns.
+
+    Cuts only where ``starts_turn`` is true, so tool calls and their results
+    always stay together. ``keep_first`` preserves a leading system message.
+    A ``max_turns`` of 0 disables trimming.
+    """
+    if max_turns <= 0:
+        return messages
+    turn_starts = [i for i, m in enumerate(messages) if starts_turn(m)]
+    if len(turn_starts) <= max_turns:
+        return messages
+    head = messages[:1] if keep_first else []
+    return head + messages[turn_starts[-max_turns]:]
+
+
 class Provider:
     """
     Wraps an LLM SDK client with a uniform interface for the demo data generator.
@@ -392,6 +454,16 @@ class Provider:
     def reset_conversation(self):
         self.messages = []
 
+    def trim_history(self, max_turns: int):
+        """Drop the oldest turns, keeping any leading system message.
+
+        Providers that keep their history somewhere other than ``messages``
+        override this.
+        """
+        first = self.messages[0] if self.messages else None
+        has_system = isinstance(first, dict) and first.get("role") == "system"
+        self.messages = _trim_turns(self.messages, max_turns, _starts_user_turn, has_system)
+
     def chat(self, message: str) -> str:
         raise NotImplementedError
 
@@ -414,15 +486,19 @@ def _make_anthropic(posthog_client: Posthog) -> Provider:
 
     provider = Provider("Anthropic")
 
+    # Everything except the message list is fixed for the life of the provider
+    request_template = {
+        "model": ANTHROPIC_MODEL,
+        "max_tokens": DEFAULT_MAX_TOKENS,
+        "posthog_distinct_id": os.getenv("POSTHOG_DISTINCT_ID", DEFAULT_POSTHOG_DISTINCT_ID),
+        "tools": ANTHROPIC_TOOLS,
+    }
+
     def chat(message: str) -> str:
         provider.messages.append({"role": "user", "content": message})
-        response = client.messages.create(
-            model=ANTHROPIC_MODEL,
-            max_tokens=DEFAULT_MAX_TOKENS,
-            posthog_distinct_id=os.getenv("POSTHOG_DISTINCT_ID", DEFAULT_POSTHOG_DISTINCT_ID),
-            tools=ANTHROPIC_TOOLS,
-            messages=provider.messages,
-        )
+        params = request_template.copy()
+        params["messages"] = provider.messages
+        response = client.messages.create(**params)
         assistant_content = []
         display_parts = []
         tool_results = []
@@ -433,7 +509,7 @@ def _make_anthropic(posthog_client: Posthog) -> Provider:
                 result = execute_tool(block.name, block.input)
                 if result is not None:
                     text = format_tool_result(block.name, result)
-                    tool_results.append(text)
+                    tool_results.append({"type": "tool_result", "tool_use_id": block.id, "content": text})
                     display_parts.append(text)
             elif block.type == "text":
                 assistant_content.append(block)
@@ -441,14 +517,9 @@ def _make_anthropic(posthog_client: Posthog) -> Provider:
 
         provider.messages.append({"role": "assistant", "content": assistant_content})
 
+        # All results for this turn go back in a single user message
         if tool_results:
-            for block in response.content:
-                if block.type == "tool_use":
-                    provider.messages.append({
-                        "role": "user",
-                        "content": [{"type": "tool_result", "tool_use_id": block.id, "content": tool_results[0]}],
-                    })
-                    break
+            provider.messages.append({"role": "user", "content": tool_results})
 
         return "\n\n".join(display_parts) if display_parts else "No response received"
 
@@ -466,16 +537,20 @@ def _make_anthropic_streaming(posthog_client: Posthog) -> Provider:
 
     provider = Provider("Anthropic Streaming")
 
+    # Everything except the message list is fixed for the life of the provider
+    request_template = {
+        "model": ANTHROPIC_MODEL,
+        "max_tokens": DEFAULT_MAX_TOKENS,
+        "posthog_distinct_id": os.getenv("POSTHOG_DISTINCT_ID", DEFAULT_POSTHOG_DISTINCT_ID),
+        "tools": ANTHROPIC_TOOLS,
+        "stream": True,
+    }
+
     def chat_stream(message: str) -> Generator[str, None, None]:
         provider.messages.append({"role": "user", "content": message})
-        stream = client.messages.create(
-            model=ANTHROPIC_MODEL,
-            max_tokens=DEFAULT_MAX_TOKENS,
-            posthog_distinct_id=os.getenv("POSTHOG_DISTINCT_ID", DEFAULT_POSTHOG_DISTINCT_ID),
-            tools=ANTHROPIC_TOOLS,
-            messages=provider.messages,
-            stream=True,
-        )
+        params = request_template.copy()
+        params["messages"] = provider.messages
+        stream = client.messages.create(**params)
 
         accumulated = ""
         assistant_content = []
@@ -530,6 +605,7 @@ def _make_anthropic_streaming(posthog_client: Posthog) -> Provider:
                                 break
                         result = execute_tool(last["name"], last["input"])
                         if result is not None:
+                            last["result"] = result
                             yield "\n\n" + format_tool_result(last["name"], result)
                     except (json.JSONDecodeError, AttributeError):
                         pass
@@ -539,14 +615,14 @@ def _make_anthropic_streaming(posthog_client: Posthog) -> Provider:
             "content": assistant_content if assistant_content else [{"type": "text", "text": accumulated or ""}],
         })
 
-        for tool in tools_used:
-            if tool.get("input"):
-                result = execute_tool(tool["name"], tool["input"])
-                if result is not None:
-                    provider.messages.append({
-                        "role": "user",
-                        "content": [{"type": "tool_result", "tool_use_id": tool["id"], "content": result}],
-                    })
+        # Reuse the results from the stream pass; one user message carries them all
+        tool_results = [
+            {"type": "tool_result", "tool_use_id": tool["id"], "content": tool["result"]}
+            for tool in tools_used
+            if "result" in tool
+        ]
+        if tool_results:
+            provider.messages.append({"role": "user", "content": tool_results})
 
     def chat(message: str) -> str:
         return "".join(chat_stream(message)) or "No response received"
@@ -566,16 +642,20 @@ def _make_openai(posthog_client: Posthog) -> Provider:
 
     provider = Provider("OpenAI Responses")
 
+    # Everything except the message list is fixed for the life of the provider
+    request_template = {
+        "model": OPENAI_CHAT_MODEL,
+        "max_output_tokens": DEFAULT_MAX_TOKENS,
+        "posthog_distinct_id": os.getenv("POSTHOG_DISTINCT_ID", DEFAULT_POSTHOG_DISTINCT_ID),
+        "instructions": SYSTEM_PROMPT_FRIENDLY,
+        "tools": OPENAI_RESPONSES_TOOLS,
+    }
+
     def chat(message: str) -> str:
         provider.messages.append({"role": "user", "content": message})
-        response = client.responses.create(
-            model=OPENAI_CHAT_MODEL,
-            max_output_tokens=DEFAULT_MAX_TOKENS,
-            posthog_distinct_id=os.getenv("POSTHOG_DISTINCT_ID", DEFAULT_POSTHOG_DISTINCT_ID),
-            input=provider.messages,
-            instructions=SYSTEM_PROMPT_FRIENDLY,
-            tools=OPENAI_RESPONSES_TOOLS,
-        )
+        params = request_template.copy()
+        params["input"] = provider.messages
+        response = client.responses.create(**params)
 
         display_parts = []
         assistant_items = []
@@ -587,11 +667,7 @@ def _make_openai(posthog_client: Posthog) -> Provider:
                         display_parts.append(ci.text)
                         assistant_items.append({"type": "output_text", "text": ci.text})
             if hasattr(item, "name"):
-                args = {}
-                try:
-                    args = json.loads(getattr(item, "arguments", "{}"))
-                except json.JSONDecodeError:
-                    pass
+                args = _parse_tool_args(getattr(item, "arguments", "{}"))
                 result = execute_tool(item.name, args)
                 if result is not None:
                     display_parts.append(format_tool_result(item.name, result))
@@ -615,64 +691,65 @@ def _make_openai_streaming(posthog_client: Posthog) -> Provider:
     )
 
     provider = Provider("OpenAI Responses Streaming")
+    # Per provider, so a slow tool in one conversation never queues another's
+    tool_executor = ThreadPoolExecutor(max_workers=4, thread_name_prefix="tool")
+
+    # Everything except the message list is fixed for the life of the provider
+    request_template = {
+        "model": OPENAI_CHAT_MODEL,
+        "max_output_tokens": DEFAULT_MAX_TOKENS,
+        "posthog_distinct_id": os.getenv("POSTHOG_DISTINCT_ID", DEFAULT_POSTHOG_DISTINCT_ID),
+        "instructions": SYSTEM_PROMPT_FRIENDLY,
+        "tools": OPENAI_RESPONSES_TOOLS,
+        "stream": True,
+    }
 
     def chat_stream(message: str) -> Generator[str, None, None]:
         provider.messages.append({"role": "user", "content": message})
-        stream = client.responses.create(
-            model=OPENAI_CHAT_MODEL,
-            max_output_tokens=DEFAULT_MAX_TOKENS,
-            posthog_distinct_id=os.getenv("POSTHOG_DISTINCT_ID", DEFAULT_POSTHOG_DISTINCT_ID),
-            input=provider.messages,
-            instructions=SYSTEM_PROMPT_FRIENDLY,
-            tools=OPENAI_RESPONSES_TOOLS,
-            stream=True,
-        )
+        params = request_template.copy()
+        params["input"] = provider.messages
+        stream = client.responses.create(**params)
 
         accumulated = ""
         tool_calls = []
         assistant_items = []
 
         for chunk in stream:
-            if not hasattr(chunk, "type"):
-                continue
-            if chunk.type == "response.output_text.delta" and hasattr(chunk, "delta") and chunk.delta:
-                accumulated += chunk.delta
-                yield chunk.delta
-            elif chunk.type == "response.output_item.added":
-                if hasattr(chunk, "item") and getattr(chunk.item, "type", None) == "function_call":
+            # One attribute lookup per event; most events are text deltas
+            chunk_type = getattr(chunk, "type", None)
+            if chunk_type == "response.output_text.delta":
+                delta = getattr(chunk, "delta", None)
+                if delta:
+                    accumulated += delta
+                    yield delta
+            elif chunk_type == "response.output_item.added":
+                item = getattr(chunk, "item", None)
+                if getattr(item, "type", None) == "function_call":
                     idx = getattr(chunk, "output_index", len(tool_calls))
                     if idx >= len(tool_calls):
                         tool_calls.append({
-                            "name": getattr(chunk.item, "name", "get_weather"),
-                            "call_id": getattr(chunk.item, "call_id", ""),
+                            "name": getattr(item, "name", "get_weather"),
+                            "call_id": getattr(item, "call_id", ""),
                             "arguments": "",
                         })
-            elif chunk.type == "response.function_call_arguments.done":
+            elif chunk_type == "response.function_call_arguments.done":
                 idx = getattr(chunk, "output_index", 0)
                 if idx < len(tool_calls):
                     tc = tool_calls[idx]
                     tc["arguments"] = getattr(chunk, "arguments", "{}")
-                    args = {}
-                    try:
-                        args = json.loads(tc["arguments"])
-                    except json.JSONDecodeError:
-                        pass
-                    result = execute_tool(tc["name"], args)
-                    if result is not None:
-                        yield "\n\n" + format_tool_result(tc["name"], result)
+                    # Run the tool while the rest of the response streams in
+                    args = _parse_tool_args(tc["arguments"])
+                    tc["future"] = tool_executor.submit(execute_tool, tc["name"], args)
 
         if accumulated:
             assistant_items.append({"type": "output_text", "text": accumulated})
         for tc in tool_calls:
-            if tc.get("arguments"):
-                args = {}
-                try:
-                    args = json.loads(tc["arguments"])
-                except json.JSONDecodeError:
-                    pass
-                result = execute_tool(tc["name"], args)
-                if result is not None:
-                    assistant_items.append({"type": "output_text", "text": result})
+            if "future" not in tc:
+                continue
+            result = tc["future"].result()
+            if result is not None:
+                yield "\n\n" + format_tool_result(tc["name"], result)
+                assistant_items.append({"type": "output_text", "text": result})
 
         if assistant_items:
             provider.messages.append({"role": "assistant", "content": assistant_items})
@@ -695,6 +772,17 @@ def _make_openai_chat(posthog_client: Posthog) -> Provider:
 
     provider = Provider("OpenAI Chat Completions")
     provider.messages = [{"role": "system", "content": SYSTEM_PROMPT_FRIENDLY}]
+    # Per provider, so a slow tool in one conversation never queues another's
+    tool_executor = ThreadPoolExecutor(max_workers=4, thread_name_prefix="tool")
+
+    # Everything except the message list is fixed for the life of the provider
+    request_template = {
+        "model": OPENAI_CHAT_MODEL,
+        "max_completion_tokens": DEFAULT_MAX_TOKENS,
+        "posthog_distinct_id": os.getenv("POSTHOG_DISTINCT_ID", DEFAULT_POSTHOG_DISTINCT_ID),
+        "tools": OPENAI_CHAT_TOOLS,
+        "tool_choice": "auto",
+    }
 
     def reset():
         provider.messages = [{"role": "system", "content": SYSTEM_PROMPT_FRIENDLY}]
@@ -703,14 +791,9 @@ def _make_openai_chat(posthog_client: Posthog) -> Provider:
 
     def chat(message: str) -> str:
         provider.messages.append({"role": "user", "content": message})
-        response = client.chat.completions.create(
-            model=OPENAI_CHAT_MODEL,
-            max_completion_tokens=DEFAULT_MAX_TOKENS,
-            posthog_distinct_id=os.getenv("POSTHOG_DISTINCT_ID", DEFAULT_POSTHOG_DISTINCT_ID),
-            messages=provider.messages,
-            tools=OPENAI_CHAT_TOOLS,
-            tool_choice="auto",
-        )
+        params = request_template.copy()
+        params["messages"] = provider.messages
+        response = client.chat.completions.create(**params)
 
         choice = response.choices[0]
         msg = choice.message
@@ -728,13 +811,13 @@ def _make_openai_chat(posthog_client: Posthog) -> Provider:
                     for tc in msg.tool_calls
                 ],
             })
+            # Run the tools concurrently, then record results in call order
+            pending = []
             for tc in msg.tool_calls:
-                args = {}
-                try:
-                    args = json.loads(tc.function.arguments)
-                except json.JSONDecodeError:
-                    pass
-                result = execute_tool(tc.function.name, args)
+                args = _parse_tool_args(tc.function.arguments)
+                pending.append((tc, tool_executor.submit(execute_tool, tc.function.name, args)))
+            for tc, future in pending:
+                result = future.result()
                 if result is not None:
                     display_parts.append(format_tool_result(tc.function.name, result))
                     provider.messages.append({"role": "tool", "tool_call_id": tc.id, "content": result})
@@ -758,6 +841,17 @@ def _make_openai_chat_streaming(posthog_client: Posthog) -> Provider:
     provider = Provider("OpenAI Chat Completions Streaming")
     provider.messages = [{"role": "system", "content": SYSTEM_PROMPT_FRIENDLY}]
 
+    # Everything except the message list is fixed for the life of the provider
+    request_template = {
+        "model": OPENAI_CHAT_MODEL,
+        "max_completion_tokens": DEFAULT_MAX_TOKENS,
+        "posthog_distinct_id": os.getenv("POSTHOG_DISTINCT_ID", DEFAULT_POSTHOG_DISTINCT_ID),
+        "tools": OPENAI_CHAT_TOOLS,
+        "tool_choice": "auto",
+        "stream": True,
+        "stream_options": {"include_usage": True},
+    }
+
     def reset():
         provider.messages = [{"role": "system", "content": SYSTEM_PROMPT_FRIENDLY}]
 
@@ -765,20 +859,14 @@ def _make_openai_chat_streaming(posthog_client: Posthog) -> Provider:
 
     def chat_stream(message: str) -> Generator[str, None, None]:
         provider.messages.append({"role": "user", "content": message})
-        stream = client.chat.completions.create(
-            model=OPENAI_CHAT_MODEL,
-            max_completion_tokens=DEFAULT_MAX_TOKENS,
-            posthog_distinct_id=os.getenv("POSTHOG_DISTINCT_ID", DEFAULT_POSTHOG_DISTINCT_ID),
-            messages=provider.messages,
-            tools=OPENAI_CHAT_TOOLS,
-            tool_choice="auto",
-            stream=True,
-            stream_options={"include_usage": True},
-        )
+        params = request_template.copy()
+        params["messages"] = provider.messages
+        stream = client.chat.completions.create(**params)
 
         accumulated = ""
         tool_calls_by_index = {}
         tool_calls = []
+        tool_messages = []
 
         for chunk in stream:
             if not (hasattr(chunk, "choices") and chunk.choices):
@@ -807,13 +895,10 @@ def _make_openai_chat_streaming(posthog_client: Posthog) -> Provider:
                 completed = [tool_calls_by_index[i] for i in sorted(tool_calls_by_index.keys())]
                 for tc in completed:
                     tool_calls.append(tc)
-                    args = {}
-                    try:
-                        args = json.loads(tc["function"]["arguments"])
-                    except json.JSONDecodeError:
-                        pass
+                    args = _parse_tool_args(tc["function"]["arguments"])
                     result = execute_tool(tc["function"]["name"], args)
                     if result is not None:
+                        tool_messages.append({"role": "tool", "tool_call_id": tc["id"], "content": result})
                         yield "\n\n" + format_tool_result(tc["function"]["name"], result)
 
         assistant_msg = {"role": "assistant"}
@@ -822,16 +907,7 @@ def _make_openai_chat_streaming(posthog_client: Posthog) -> Provider:
         if tool_calls:
             assistant_msg["tool_calls"] = tool_calls
         provider.messages.append(assistant_msg)
-
-        for tc in tool_calls:
-            args = {}
-            try:
-                args = json.loads(tc["function"]["arguments"])
-            except json.JSONDecodeError:
-                pass
-            result = execute_tool(tc["function"]["name"], args)
-            if result is not None:
-                provider.messages.append({"role": "tool", "tool_call_id": tc["id"], "content": result})
+        provider.messages.extend(tool_messages)
 
     def chat(message: str) -> str:
         return "".join(chat_stream(message)) or "No response received"
@@ -841,17 +917,21 @@ def _make_openai_chat_streaming(posthog_client: Posthog) -> Provider:
     return provider
 
 
+def _starts_gemini_turn(content: dict) -> bool:
+    """User text opens a Gemini turn; tool results are recorded as model content."""
+    return content["role"] == "user" and any("text" in part for part in content["parts"])
+
+
 def _make_gemini(posthog_client: Posthog) -> Provider:
     from posthog.ai.gemini import Client
-    from google.genai import types
 
     client = Client(
         api_key=os.getenv("GEMINI_API_KEY"),
         posthog_client=posthog_client,
     )
 
-    tools_obj = types.Tool(function_declarations=GEMINI_TOOL_DECLARATIONS)
-    config = types.GenerateContentConfig(tools=[tools_obj])
+    config = _gemini_config()
+    distinct_id = os.getenv("POSTHOG_DISTINCT_ID", DEFAULT_POSTHOG_DISTINCT_ID)
 
     provider = Provider("Google Gemini")
     provider._history = []
@@ -862,11 +942,16 @@ def _make_gemini(posthog_client: Posthog) -> Provider:
 
     provider.reset_conversation = reset
 
+    def trim_history(max_turns: int):
+        provider._history = _trim_turns(provider._history, max_turns, _starts_gemini_turn, False)
+
+    provider.trim_history = trim_history
+
     def chat(message: str) -> str:
         provider._history.append({"role": "user", "parts": [{"text": message}]})
         response = client.models.generate_content(
             model=GEMINI_MODEL,
-            posthog_distinct_id=os.getenv("POSTHOG_DISTINCT_ID", DEFAULT_POSTHOG_DISTINCT_ID),
+            posthog_distinct_id=distinct_id,
             contents=provider._history,
             config=config,
         )
@@ -901,15 +986,14 @@ def _make_gemini(posthog_client: Posthog) -> Provider:
 
 def _make_gemini_streaming(posthog_client: Posthog) -> Provider:
     from posthog.ai.gemini import Client
-    from google.genai import types
 
     client = Client(
         api_key=os.getenv("GEMINI_API_KEY"),
         posthog_client=posthog_client,
     )
 
-    tools_obj = types.Tool(function_declarations=GEMINI_TOOL_DECLARATIONS)
-    config = types.GenerateContentConfig(tools=[tools_obj])
+    config = _gemini_config()
+    distinct_id = os.getenv("POSTHOG_DISTINCT_ID", DEFAULT_POSTHOG_DISTINCT_ID)
 
     provider = Provider("Google Gemini Streaming")
     provider._history = []
@@ -920,11 +1004,16 @@ def _make_gemini_streaming(posthog_client: Posthog) -> Provider:
 
     provider.reset_conversation = reset
 
+    def trim_history(max_turns: int):
+        provider._history = _trim_turns(provider._history, max_turns, _starts_gemini_turn, False)
+
+    provider.trim_history = trim_history
+
     def chat_stream(message: str) -> Generator[str, None, None]:
         provider._history.append({"role": "user", "parts": [{"text": message}]})
         stream = client.models.generate_content_stream(
             model=GEMINI_MODEL,
-            posthog_distinct_id=os.getenv("POSTHOG_DISTINCT_ID", DEFAULT_POSTHOG_DISTINCT_ID),
+            posthog_distinct_id=distinct_id,
             contents=provider._history,
             config=config,
         )
@@ -968,10 +1057,9 @@ def _make_gemini_streaming(posthog_client: Posthog) -> Provider:
 def _make_langchain(posthog_client: Posthog) -> Provider:
     from posthog.ai.langchain import CallbackHandler
     from langchain_core.tools import tool
-    from langchain_core.messages import ToolMessage
+    from langchain_core.messages import HumanMessage, SystemMessage, ToolMessage
 
     callback_handler = CallbackHandler(client=posthog_client)
-    openai_api_key = os.getenv("OPENAI_API_KEY")
 
     @tool
     def get_weather_tool(latitude: float, longitude: float, location_name: str) -> str:
@@ -997,6 +1085,8 @@ def _make_langchain(posthog_client: Posthog) -> Provider:
     langchain_tools = [get_weather_tool, tell_joke_tool]
     tool_map = {t.name: t for t in langchain_tools}
 
+    model_with_tools = _shared_chat_openai(OPENAI_CHAT_MODEL, 0).bind_tools(langchain_tools)
+
     provider = Provider("LangChain (OpenAI)")
     provider._lc_messages = [SystemMessage(content=SYSTEM_PROMPT_ASSISTANT)]
 
@@ -1006,11 +1096,15 @@ def _make_langchain(posthog_client: Posthog) -> Provider:
 
     provider.reset_conversation = reset
 
+    def trim_history(max_turns: int):
+        provider._lc_messages = _trim_turns(
+            provider._lc_messages, max_turns, lambda m: isinstance(m, HumanMessage), True
+        )
+
+    provider.trim_history = trim_history
+
     def chat(message: str) -> str:
         provider._lc_messages.append(HumanMessage(content=message))
-
-        model = ChatOpenAI(openai_api_key=openai_api_key, temperature=0, model_name=OPENAI_CHAT_MODEL)
-        model_with_tools = model.bind_tools(langchain_tools)
         response = model_with_tools.invoke(
             provider._lc_messages,
             config={"callbacks": [callback_handler]},
@@ -1060,14 +1154,14 @@ def _make_litellm(posthog_client: Posthog) -> Provider:
 
     provider.reset_conversation = reset
 
+    distinct_id = os.getenv("POSTHOG_DISTINCT_ID", DEFAULT_POSTHOG_DISTINCT_ID)
+    metadata = {"distinct_id": distinct_id, "user_id": distinct_id}
+    if ai_session_id:
+        metadata["$ai_session_id"] = ai_session_id
+
     def _metadata():
-        m = {
-            "distinct_id": os.getenv("POSTHOG_DISTINCT_ID", DEFAULT_POSTHOG_DISTINCT_ID),
-            "user_id": os.getenv("POSTHOG_DISTINCT_ID", DEFAULT_POSTHOG_DISTINCT_ID),
-        }
-        if ai_session_id:
-            m["$ai_session_id"] = ai_session_id
-        return m
+        # LiteLLM may annotate the dict it is given, so hand each call a copy
+        return metadata.copy()
 
     def chat(message: str) -> str:
         provider.messages.append({"role": "user", "content": message})
@@ -1093,11 +1187,7 @@ def _make_litellm(posthog_client: Posthog) -> Provider:
                     display_parts.append(assistant_message.content)
 
                 for tc in assistant_message.tool_calls:
-                    args = {}
-                    try:
-                        args = json.loads(tc.function.arguments)
-                    except json.JSONDecodeError:
-                        pass
+                    args = _parse_tool_args(tc.function.arguments)
                     result = execute_tool(tc.function.name, args)
                     if result is not None:
                         display_parts.append(format_tool_result(tc.function.name, result))
@@ -1153,14 +1243,14 @@ def _make_litellm_streaming(posthog_client: Posthog) -> Provider:
 
     provider.reset_conversation = reset
 
+    distinct_id = os.getenv("POSTHOG_DISTINCT_ID", DEFAULT_POSTHOG_DISTINCT_ID)
+    metadata = {"distinct_id": distinct_id, "user_id": distinct_id}
+    if ai_session_id:
+        metadata["$ai_session_id"] = ai_session_id
+
     def _metadata():
-        m = {
-            "distinct_id": os.getenv("POSTHOG_DISTINCT_ID", DEFAULT_POSTHOG_DISTINCT_ID),
-            "user_id": os.getenv("POSTHOG_DISTINCT_ID", DEFAULT_POSTHOG_DISTINCT_ID),
-        }
-        if ai_session_id:
-            m["$ai_session_id"] = ai_session_id
-        return m
+        # LiteLLM may annotate the dict it is given, so hand each call a copy
+        return metadata.copy()
 
     def chat_stream(message: str) -> Generator[str, None, None]:
         provider.messages.append({"role": "user", "content": message})
@@ -1213,11 +1303,7 @@ def _make_litellm_streaming(posthog_client: Posthog) -> Provider:
                     "tool_calls": tool_calls_data,
                 })
                 for tc in tool_calls_data:
-                    args = {}
-                    try:
-                        args = json.loads(tc["function"]["arguments"])
-                    except json.JSONDecodeError:
-                        pass
+                    args = _parse_tool_args(tc["function"]["arguments"])
                     result = execute_tool(tc["function"]["name"], args)
                     if result is not None:
                         text = format_tool_result(tc["function"]["name"], result)
@@ -1565,17 +1651,16 @@ class UserSimulator:
     """
 
     def __init__(self, topic: str, persona: str, max_turns: int):
+        from langchain_core.messages import SystemMessage
+
         self.topic = topic
         self.persona = persona
         self.max_turns = max_turns
         self.current_turn = 0
 
-        # Use a lightweight model for user simulation
-        self.llm = ChatOpenAI(
-            model="gpt-4o-mini",
-            temperature=0.8,  # Higher temperature for more varied user messages
-            api_key=os.getenv("OPENAI_API_KEY"),
-        )
+        # Use a lightweight model for user simulation; higher temperature
+        # for more varied user messages
+        self.llm = _shared_chat_openai("gpt-4o-mini", 0.8)
 
         self.system_prompt = f"""You are simulating a human user having a conversation with an AI assistant.
 
@@ -1605,6 +1690,8 @@ Do not include any prefix like "User:" - just output the message content directl
         Returns:
             tuple: (message, should_end) where should_end indicates if this should be the last turn
         """
+        from langchain_core.messages import AIMessage, HumanMessage
+
         self.current_turn += 1
 
         # Add assistant's response to our history if provided
@@ -1707,6 +1794,7 @@ def get_response_from_provider(provider, message: str, verbose: bool = True) ->
 def run_conversation(
     provider_key: str,
     max_turns: int = 5,
+    max_history_turns: int = DEFAULT_MAX_HISTORY_TURNS,
     verbose: bool = True,
     delay_between_turns: float = 1.0,
     topic: Optional[str] = None,
@@ -1730,47 +1818,51 @@ def run_conversation(
     # Create span name: topic_provider (e.g., "weather_in_various_cities_openai_chat")
     span_name = f"{slugify(topic)}_{slugify(provider_name)}"
 
-    # Create a new session for this conversation
+    # Create a new session for this conversation; none of the providers set
+    # their own span name, so it can go straight into the super properties
     session_id = str(uuid.uuid4())
-    posthog_client = create_posthog_client(session_id=session_id)
+    posthog_client = create_posthog_client(session_id=session_id, span_name=span_name)
 
-    # Create the target provider (this may set its own span name)
+    # Create the target provider
     provider = create_provider(provider_key, posthog_client)
 
-    # Override the span name AFTER provider creation (providers set their own, we want ours)
-    posthog_client.super_properties = {
-        **(posthog_client.super_properties or {}),
-        "$ai_span_name": span_name,
-    }
-
     # Create the user simulator
     simulator = UserSimulator(topic=topic, persona=persona, max_turns=max_turns)
 
     if verbose:
-        print(f"\n{'='*60}")
-        print(f"Session: {session_id}")
-        print(f"Distinct ID: {conversation_distinct_id}")
-        print(f"Span: {span_name}")
-        print(f"Provider: {provider_name}")
-        print(f"Topic: {topic}")
-        print(f"Persona: {persona}")
-        print(f"Max turns: {max_turns}")
-        print(f"{'='*60}\n")
+        # Single print for the header block
+        print(
+            f"\n{DIVIDER}\n"
+            f"Session: {session_id}\n"
+            f"Distinct ID: {conversation_distinct_id}\n"
+            f"Span: {span_name}\n"
+            f"Provider: {provider_name}\n"
+            f"Topic: {topic}\n"
+            f"Persona: {persona}\n"
+            f"Max turns: {max_turns}\n"
+            f"{DIVIDER}\n"
+        )
 
     conversation_history = []
     actual_turns = 0
     assistant_response = None
+    # Wall-clock time spent waiting on the simulator vs. the provider under test
+    simulator_seconds = 0.0
+    provider_seconds = 0.0
 
     while True:
         actual_turns += 1
 
         # Generate user message
+        started = time.perf_counter()
         try:
             user_message, should_end = simulator.generate_message(assistant_response)
         except Exception as e:
             if verbose:
                 print(f"Error generating user message: {e}")
             break
+        finally:
+            simulator_seconds += time.perf_counter() - started
 
         if verbose:
             print(f"[Turn {actual_turns}]")
@@ -1779,16 +1871,22 @@ def run_conversation(
         conversation_history.append({"role": "user", "content": user_message})
 
         # Get response from provider
+        started = time.perf_counter()
         try:
             assistant_response = get_response_from_provider(provider, user_message, verbose)
             conversation_history.append({"role": "assistant", "content": assistant_response})
+            provider.trim_history(max_history_turns)
         except Exception as e:
             if verbose:
                 print(f"Error from provider: {e}")
             conversation_history.append({"role": "error", "content": str(e)})
             break
+        finally:
+            turn_seconds = time.perf_counter() - started
+            provider_seconds += turn_seconds
 
         if verbose:
+            print(f"({turn_seconds * 1000:.0f} ms)")
             print()
 
         # Check if we should end
@@ -1811,6 +1909,8 @@ def run_conversation(
         "topic": topic,
         "persona": persona,
         "turns": actual_turns,
+        "simulator_seconds": simulator_seconds,
+        "provider_seconds": provider_seconds,
         "history": conversation_history,
     }
 
@@ -1843,6 +1943,9 @@ Examples:
   # Run 20 conversations in parallel with 5 workers
   python generate_demo_data.py --conversations 20 --parallel 5
 
+  # Same, but never more than 2 at a time against any one provider
+  python generate_demo_data.py --conversations 20 --parallel 5 --max-per-provider 2
+
 Available providers:
   anthropic, anthropic_streaming, gemini, gemini_streaming,
   langchain, openai, openai_streaming, openai_chat,
@@ -1862,6 +1965,13 @@ Available providers:
         default=5,
         help="Maximum turns per conversation (default: 5)",
     )
+    parser.add_argument(
+        "--max-history-turns",
+        type=int,
+        default=DEFAULT_MAX_HISTORY_TURNS,
+        metavar="N",
+        help=f"Resend only the last N user turns to the provider (default: {DEFAULT_MAX_HISTORY_TURNS}, 0 keeps everything)",
+    )
     parser.add_argument(
         "-p", "--providers",
         nargs="+",
@@ -1901,6 +2011,13 @@ Available providers:
         metavar="N",
         help="Run N conversations in parallel (default: 1, sequential)",
     )
+    parser.add_argument(
+        "--max-per-provider",
+        type=int,
+        default=0,
+        metavar="N",
+        help="With --parallel, run at most N conversations against the same provider at once (default: 0, no limit)",
+    )
     parser.add_argument(
         "--tools",
         action="store_true",
@@ -1978,14 +2095,16 @@ Available providers:
     verbose = not args.quiet
 
     if verbose:
-        print("\n" + "=" * 60)
+        print("\n" + DIVIDER)
         print("PostHog LLM Analytics Demo Data Generator")
-        print("=" * 60)
+        print(DIVIDER)
         print(f"Conversations to generate: {args.conversations}")
         print(f"Max turns per conversation: {args.max_turns}")
         print(f"Providers: {', '.join(available_providers)}")
         print(f"Delay between turns: {args.delay}s")
         print(f"Parallel workers: {args.parallel}")
+        if args.max_per_provider > 0:
+            print(f"Max per provider: {args.max_per_provider}")
         if args.tools:
             print(f"Mode: TOOLS (tool-heavy conversations)")
         if args.topic:
@@ -1996,13 +2115,33 @@ Available providers:
             print(f"Distinct ID: {args.distinct_id}")
         else:
             print(f"Distinct ID: random per conversation")
-        print("=" * 60)
+        print(DIVIDER)
 
     results = []
 
+    # Per-provider concurrency caps, so a large --parallel doesn't push a
+    # single provider into its rate limits
+    provider_slots = {}
+    if args.max_per_provider > 0:
+        provider_slots = {p: threading.BoundedSemaphore(args.max_per_provider) for p in available_providers}
+
+    def claim_provider() -> str:
+        """Pick a random provider, preferring one with a free slot.
+
+        Only blocks when every provider is at its cap, so a busy provider
+        doesn't idle a worker while others could take the conversation.
+        """
+        if not provider_slots:
+            return random.choice(available_providers)
+        candidates = random.sample(available_providers, len(available_providers))
+        for provider_key in candidates:
+            if provider_slots[provider_key].acquire(blocking=False):
+                return provider_key
+        provider_slots[candidates[0]].acquire()
+        return candidates[0]
+
     # Helper function for running a single conversation (used by both sequential and parallel)
     def run_single_conversation(conv_index: int):
-        provider_key = random.choice(available_providers)
         # In parallel mode, we use quiet mode to avoid jumbled output
         use_verbose = verbose and args.parallel == 1
 
@@ -2013,15 +2152,21 @@ Available providers:
             topic = topic or random.choice(TOOL_TOPICS)
             persona = persona or random.choice(TOOL_PERSONAS)
 
-        return run_conversation(
-            provider_key=provider_key,
-            max_turns=args.max_turns,
-            verbose=use_verbose,
-            delay_between_turns=args.delay,
-            topic=topic,
-            persona=persona,
-            distinct_id=args.distinct_id,
-        )
+        provider_key = claim_provider()
+        try:
+            return run_conversation(
+                provider_key=provider_key,
+                max_turns=args.max_turns,
+                max_history_turns=args.max_history_turns,
+                verbose=use_verbose,
+                delay_between_turns=args.delay,
+                topic=topic,
+                persona=persona,
+                distinct_id=args.distinct_id,
+            )
+        finally:
+            if provider_slots:
+                provider_slots[provider_key].release()
 
     if args.parallel > 1:
         # Parallel execution
@@ -2073,21 +2218,26 @@ Available providers:
 
     # Print summary
     if verbose and results:
-        print("\n" + "=" * 60)
+        print("\n" + DIVIDER)
         print("Summary")
-        print("=" * 60)
+        print(DIVIDER)
         print(f"Total conversations: {len(results)}")
 
         provider_counts = {}
         topic_counts = {}
         total_turns = 0
+        simulator_seconds = 0.0
+        provider_seconds = 0.0
 
         for r in results:
             provider_counts[r["provider"]] = provider_counts.get(r["provider"], 0) + 1
             topic_counts[r["topic"]] = topic_counts.get(r["topic"], 0) + 1
             total_turns += r["turns"]
+            simulator_seconds += r["simulator_seconds"]
+            provider_seconds += r["provider_seconds"]
 
         print(f"Total turns: {total_turns}")
+        print(f"Time in providers: {provider_seconds:.1f}s, in user simulator: {simulator_seconds:.1f}s")
         print(f"\nBy Provider:")
         for provider, count in sorted(provider_counts.items()):
             print(f"  {provider}: {count}")
@@ -2096,9 +2246,9 @@ Available providers:
         for topic, count in sorted(topic_counts.items()):
             print(f"  {topic}: {count}")
 
-        print("=" * 60)
+        print(DIVIDER)
         print("Done! Check your PostHog dashboard for LLM analytics data.")
-        print("=" * 60 + "\n")
+        print(DIVIDER + "\n")
 
 
 if __name__ == "__main__":
@@ -17,12 +17,13 @@ Environment:
 """
 
 import argparse
+import http.client
 import json
 import os
 import subprocess
 import sys
-import urllib.request
 import uuid
+from urllib.parse import urlsplit
 from datetime import datetime, timedelta, timezone
 
 
@@ -30,6 +31,10 @@ POSTHOG_HOST = os.getenv("POSTHOG_HOST", "http://localhost:8010")
 POSTHOG_API_KEY = os.getenv("POSTHOG_API_KEY", "")
 DISTINCT_ID = os.getenv("POSTHOG_DISTINCT_ID", "ai-events-migration-test")
 
+# Kept open across capture_event calls so the whole run shares one keep-alive
+# connection instead of paying a TCP (and TLS) handshake per event
+_connection: http.client.HTTPConnection | None = None
+
 
 def get_api_key() -> str:
     global POSTHOG_API_KEY
@@ -56,6 +61,7 @@ def get_api_key() -> str:
 
 
 def capture_event(event: str, properties: dict, timestamp: str | None = None) -> None:
+    global _connection
     payload = {
         "api_key": get_api_key(),
         "event": event,
@@ -71,13 +77,36 @@ def capture_event(event: str, properties: dict, timestamp: str | None = None) ->
         payload["timestamp"] = timestamp
 
     data = json.dumps(payload).encode("utf-8")
-    req = urllib.request.Request(
-        f"{POSTHOG_HOST}/capture/",
-        data=data,
-        headers={"Content-Type": "application/json"},
-    )
-    with urllib.request.urlopen(req) as resp:
-        resp.read()
+    url = urlsplit(POSTHOG_HOST)
+    path = f"{url.path.rstrip('/')}/capture/"
+    headers = {"Content-Type": "application/json"}
+
+    while True:
+        reused = _connection is not None
+        if not reused:
+            connection_class = http.client.HTTPSConnection if url.scheme == "https" else http.client.HTTPConnection
+            _connection = connection_class(url.netloc, timeout=30)
+        try:
+            _connection.request("POST", path, body=data, headers=headers)
+            resp = _connection.getresponse()
+            resp.read()
+            break
+        except (http.client.RemoteDisconnected, ConnectionResetError, BrokenPipeError):
+            # The server closed the idle keep-alive connection before reading
+            # the request, so it is safe to resend once on a fresh one. Any
+            # other failure may have been ingested already; resending it
+            # would duplicate the event.
+            _connection.close()
+            _connection = None
+            if not reused:
+                raise
+        except Exception:
+            _connection.close()
+            _connection = None
+            raise
+
+    if resp.status >= 400:
+        raise RuntimeError(f"Capture failed for {event}: HTTP {resp.status} {resp.reason}")
 
 
 def ts(base: datetime, offset_seconds: float) -> str:
@@ -24,55 +24,20 @@ load_dotenv(env_path, override=True)
 from langchain_core.messages import HumanMessage, SystemMessage, ToolMessage
 from langchain_core.tools import tool
 from langchain_openai import ChatOpenAI
-from opentelemetry import trace
-from opentelemetry.exporter.otlp.proto.http.trace_exporter import OTLPSpanExporter
 from opentelemetry.instrumentation.langchain import LangchainInstrumentor
-from opentelemetry.sdk.resources import Resource
 from opentelemetry.sdk.trace import TracerProvider
-from opentelemetry.sdk.trace.export import BatchSpanProcessor
 
-MODEL = "gpt-4o-mini"
+from _otel_setup import DIVIDER, configure_posthog_otel, flush, header
 
-tracer_provider: TracerProvider | None = None
+MODEL = "gpt-4o-mini"
 
 
 def setup_otel() -> TracerProvider:
-    posthog_api_key = os.getenv("POSTHOG_API_KEY")
-    posthog_host = os.getenv("POSTHOG_HOST", "http://localhost:8010")
-    debug = os.getenv("DEBUG", "0") == "1"
-
-    if not posthog_api_key:
-        print("ERROR: POSTHOG_API_KEY must be set in .env")
-        sys.exit(1)
-
-    os.environ["OTEL_EXPORTER_OTLP_TRACES_ENDPOINT"] = f"{posthog_host}/i/v0/ai/otel"
-    os.environ["OTEL_EXPORTER_OTLP_HEADERS"] = f"Authorization=Bearer {posthog_api_key}"
-
-    resource_attrs: dict[str, str] = {
-        "service.name": "langchain-otel-test",
-        "user.id": os.getenv("POSTHOG_DISTINCT_ID", "otel-test-user"),
-    }
-    if debug:
-        resource_attrs["posthog.ai.debug"] = "true"
-
-    provider = TracerProvider(resource=Resource.create(resource_attrs))
-    provider.add_span_processor(BatchSpanProcessor(OTLPSpanExporter()))
-    trace.set_tracer_provider(provider)
+    provider = configure_posthog_otel("langchain-otel-test")
     LangchainInstrumentor().instrument()
     return provider
 
 
-def flush() -> None:
-    if tracer_provider:
-        tracer_provider.force_flush()
-
-
-def header(num: int, title: str) -> None:
-    print(f"\n{'='*60}")
-    print(f"  Scenario {num}: {title}")
-    print(f"{'='*60}")
-
-
 # ---------------------------------------------------------------------------
 # Tools
 # ---------------------------------------------------------------------------
@@ -317,8 +282,7 @@ SCENARIOS: dict[int, tuple[str, Callable[..., Any]]] = {
 
 
 def main() -> None:
-    global tracer_provider
-    tracer_provider = setup_otel()
+    provider = setup_otel()
 
     debug = os.getenv("DEBUG", "0") == "1"
     host = os.getenv("POSTHOG_HOST", "http://localhost:8010")
@@ -347,11 +311,9 @@ def main() -> None:
             print(f"  FAILED: {type(e).__name__}: {e}")
             flush()
 
-    tracer_provider.shutdown()
+    provider.shutdown()
 
-    print(f"\n{'='*60}")
-    print("  All done! Check PostHog → LLM analytics → Traces")
-    print(f"{'='*60}\n")
+    print(f"\n{DIVIDER}\n  All done! Check PostHog → LLM analytics → Traces\n{DIVIDER}\n")
 
 
 if __name__ == "__main__":
@@ -10,11 +10,9 @@ Usage:
 """
 
 import os
-import sys
 import uuid
 import time
 from urllib.parse import urlparse, urlunparse
-sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
 
 from dotenv import load_dotenv
 env_path = os.path.join(os.path.dirname(__file__), '..', '.env')
@@ -21,57 +21,22 @@ from dotenv import load_dotenv
 env_path = os.path.join(os.path.dirname(__file__), "..", ".env")
 load_dotenv(env_path, override=True)
 
-from opentelemetry import trace
-from opentelemetry.exporter.otlp.proto.http.trace_exporter import OTLPSpanExporter
-from opentelemetry.sdk.resources import Resource
 from opentelemetry.sdk.trace import TracerProvider
-from opentelemetry.sdk.trace.export import BatchSpanProcessor
 from pydantic import BaseModel
 from pydantic_ai import Agent, ModelRetry, RunContext
 from pydantic_ai.models.openai import OpenAIChatModel
 
-MODEL = "gpt-4o-mini"
+from _otel_setup import DIVIDER, configure_posthog_otel, flush, header
 
-tracer_provider: TracerProvider | None = None
+MODEL = "gpt-4o-mini"
 
 
 def setup_otel() -> TracerProvider:
-    posthog_api_key = os.getenv("POSTHOG_API_KEY")
-    posthog_host = os.getenv("POSTHOG_HOST", "http://localhost:8010")
-    debug = os.getenv("DEBUG", "0") == "1"
-
-    if not posthog_api_key:
-        print("ERROR: POSTHOG_API_KEY must be set in .env")
-        sys.exit(1)
-
-    os.environ["OTEL_EXPORTER_OTLP_TRACES_ENDPOINT"] = f"{posthog_host}/i/v0/ai/otel"
-    os.environ["OTEL_EXPORTER_OTLP_HEADERS"] = f"Authorization=Bearer {posthog_api_key}"
-
-    resource_attrs: dict[str, str] = {
-        "service.name": "pydantic-ai-otel-test",
-        "user.id": os.getenv("POSTHOG_DISTINCT_ID", "otel-test-user"),
-    }
-    if debug:
-        resource_attrs["posthog.ai.debug"] = "true"
-
-    provider = TracerProvider(resource=Resource.create(resource_attrs))
-    provider.add_span_processor(BatchSpanProcessor(OTLPSpanExporter()))
-    trace.set_tracer_provider(provider)
+    provider = configure_posthog_otel("pydantic-ai-otel-test")
     Agent.instrument_all()
     return provider
 
 
-def flush() -> None:
-    if tracer_provider:
-        tracer_provider.force_flush()
-
-
-def header(num: int, title: str) -> None:
-    print(f"\n{'='*60}")
-    print(f"  Scenario {num}: {title}")
-    print(f"{'='*60}")
-
-
 # ---------------------------------------------------------------------------
 # Scenarios
 # ---------------------------------------------------------------------------
@@ -269,8 +234,7 @@ SCENARIOS: dict[int, tuple[str, Callable[..., Any]]] = {
 
 
 def main() -> None:
-    global tracer_provider
-    tracer_provider = setup_otel()
+    provider = setup_otel()
 
     debug = os.getenv("DEBUG", "0") == "1"
     host = os.getenv("POSTHOG_HOST", "http://localhost:8010")
@@ -299,11 +263,9 @@ def main() -> None:
             print(f"  FAILED: {type(e).__name__}: {e}")
             flush()
 
-    tracer_provider.shutdown()
+    provider.shutdown()
 
-    print(f"\n{'='*60}")
-    print("  All done! Check PostHog → LLM analytics → Traces")
-    print(f"{'='*60}\n")
+    print(f"\n{DIVIDER}\n  All done! Check PostHog → LLM analytics → Traces\n{DIVIDER}\n")
 
 
 if __name__ == "__main__":
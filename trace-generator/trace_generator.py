@@ -5,6 +5,7 @@ Creates arbitrarily complex nested trace data for PostHog analytics testing
 """
 
 import os
+import sys
 import uuid
 import json
 import time
@@ -583,7 +584,12 @@ class TraceGenerator:
     def clear_screen(self):
         """Clear the terminal screen"""
         if os.getenv('DEBUG') != '1':
-            os.system('cls' if platform.system() == 'Windows' else 'clear')
+            if platform.system() == 'Windows':
+                os.system('cls')
+            else:
+                # ANSI clear + cursor home; no shell spawned per redraw
+                sys.stdout.write("\x1b[2J\x1b[H")
+                sys.stdout.flush()
 
     def display_banner(self):
         """Display the application banner"""